@@ -10,11 +10,55 @@ Handles all physical device interactions:
 - Navigation (back, home, etc.)
 """
 
+import base64
+import hashlib
+import os
+import shlex
 import time
+from concurrent.futures import ThreadPoolExecutor
 import uiautomator2 as u2
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Set
 import re
 
+from logger import get_logger
+
+# Optional: OpenCV frames skip the PIL decode/PNG encode on capture
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+log = get_logger("device")
+
+
+# Step parsing: one regex pass collects every keyword in the step
+STEP_TOKEN_RE = re.compile(
+    r'\b(type|input|enter|scroll|swipe|press|back|home|wait|up|left|right)\b',
+    re.IGNORECASE
+)
+STEP_TEXT_RE = re.compile(r'\b(?:type|input|enter|text)\s+(.*)', re.IGNORECASE | re.DOTALL)
+STEP_WAIT_RE = re.compile(r'\bwait\s+(\d+)', re.IGNORECASE)
+
+# Keyword -> action kind, and which kind wins when several appear
+STEP_KINDS = {
+    "type": "type", "input": "type", "enter": "type",
+    "scroll": "scroll", "swipe": "scroll",
+    "press": "key", "back": "key",
+    "wait": "wait"
+}
+STEP_KIND_PRIORITY = ("type", "scroll", "key", "wait")
+
+# Android keycodes for batched `input keyevent`
+KEYCODES = {"home": 3, "back": 4, "enter": 66}
+
+# Echoed after each command in a batch to count how many completed
+BATCH_MARKER = "@@andromator-step-done"
+
+
+def image_extension(data: bytes) -> str:
+    """File extension matching encoded screenshot bytes (PNG or JPEG)."""
+    return ".png" if data.startswith(b"\x89PNG") else ".jpg"
+
 
 class DeviceController:
     """Manages Android device operations via UIAutomator2."""
@@ -24,8 +68,36 @@ class DeviceController:
         self.device = None
         self.screen_width = 1080
         self.screen_height = 2400
-        self.screenshot_path = "current_screen.png"
         self.hierarchy_path = "current_hierarchy.xml"
+        self.last_hierarchy_xml: Optional[str] = None
+        self.hierarchy_ttl = 0.5  # seconds a dump stays reusable
+        self._hierarchy_stamp = (0.0, -1)  # (monotonic time, action_count) of last dump
+        
+        # Bumped by every action that can change the screen
+        self.action_count = 0
+        
+        # Persist in-memory captures/hierarchy to disk for inspection
+        self.debug = bool(os.environ.get("ANDROMATOR_DEBUG"))
+        
+        # Debug dumps alternate between two files and are written off the
+        # capture path, so a pending write never blocks the next capture
+        self._dump_paths = ("current_0", "current_1")  # extension added per format
+        self._dump_index = 0
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        
+        # UI-idle wait settings (ms)
+        self.wait_for_idle_timeout = 3000
+        self.wait_for_idle_stable = 200
+        self._dump_cost_s = 0.0  # Latest hierarchy dump round trip (s)
+        
+        # Action kind -> handler(step, tokens, pixel_coords)
+        self._action_handlers = {
+            "type": self._perform_type,
+            "scroll": self._perform_scroll,
+            "key": self._perform_key,
+            "wait": self._perform_wait,
+            "click": self._perform_click
+        }
         
         self._connect()
     
@@ -33,18 +105,37 @@ class DeviceController:
         """Connect to Android device."""
         try:
             self.device = u2.connect()
-            print(f"✅ Device connected: {self.device.info}")
+            log.info("✅ Device connected: %s", self.device.info)
             
             # Get actual screen dimensions
             window_size = self.device.window_size()
             self.screen_width = window_size[0]
             self.screen_height = window_size[1]
-            print(f"📱 Screen: {self.screen_width}x{self.screen_height}")
+            log.info("📱 Screen: %dx%d", self.screen_width, self.screen_height)
+            
+            # Time one dump so wait_for_idle knows whether polling fits its budget
+            try:
+                self._hierarchy_digest()
+            except Exception as e:
+                log.debug("⚠️  Hierarchy dump unavailable: %s", e)
+            
+            # Scroll gestures only depend on screen size: compute once
+            w, h = self.screen_width, self.screen_height
+            self._swipe_coords = {
+                "down": (w // 2, h * 2 // 3, w // 2, h // 3, 0.3),
+                "up": (w // 2, h // 3, w // 2, h * 2 // 3, 0.3),
+                "left": (w * 2 // 3, h // 2, w // 3, h // 2, 0.3),
+                "right": (w // 3, h // 2, w * 2 // 3, h // 2, 0.3)
+            }
             
         except Exception as e:
-            print(f"❌ Device connection failed: {e}")
+            log.error("❌ Device connection failed: %s", e)
             raise
     
+    def close(self):
+        """Flush pending debug dumps and stop the I/O pool."""
+        self._io_pool.shutdown(wait=True)
+    
     # ==================== Screen Capture ====================
     
     def capture_screen(self, save_path: str) -> bool:
@@ -58,29 +149,93 @@ class DeviceController:
             Success status
         """
         try:
-            screenshot = self.device.screenshot()
-            screenshot.save(save_path)
-            print(f"📸 Screenshot: {save_path}")
+            if cv2 is not None:
+                # Decoded BGR frame straight from the device stream (no PIL image);
+                # the format follows save_path's extension
+                frame = self.device.screenshot(format='opencv')
+                cv2.imwrite(save_path, frame)
+            else:
+                screenshot = self.device.screenshot()
+                screenshot.save(save_path)
+            log.debug("📸 Screenshot: %s", save_path)
             return True
         except Exception as e:
-            print(f"❌ Screenshot failed: {e}")
+            log.error("❌ Screenshot failed: %s", e)
             return False
     
-    def dump_hierarchy(self) -> str:
+    def capture_screen_bytes(self) -> Optional[bytes]:
+        """
+        Capture current screen into memory.
+        
+        Takes the JPEG straight from the uiautomator2 JSON-RPC service
+        (no PIL decode, no PNG encode); the bytes go straight to
+        ScreenParser.
+        
+        Falls back to `adb shell screencap -p` (PNG over adb) when the
+        uiautomator2 screenshot service fails.
+        
+        Returns:
+            Encoded image bytes, or None on failure
+        """
+        try:
+            try:
+                # screenshot(format='raw') is gone in uiautomator2 3.x, and
+                # screenshot() always decodes; ask the service for JPEG directly
+                data = base64.b64decode(self.device.jsonrpc.takeScreenshot(1, 80))
+            except Exception as e:
+                log.warning("⚠️  uiautomator2 screenshot failed (%s), falling back to screencap PNG", e)
+                data = self.device.adb_device.shell(["screencap", "-p"], encoding=None)
+                if data.startswith(b"\x89PNG\r\r\n"):
+                    # Pre-Android 7 shell runs through a PTY that turns LF into CRLF
+                    data = data.replace(b"\r\n", b"\n")
+            if self.debug:
+                self._io_pool.submit(self._write_dump, self._next_dump_path() + image_extension(data), data)
+            log.debug("📸 Screenshot: %s KB in memory", len(data) // 1024)
+            return data
+        except Exception as e:
+            log.error("❌ Screenshot failed: %s", e)
+            return None
+    
+    def _next_dump_path(self) -> str:
+        """Next file in the two-slot debug screenshot ring."""
+        path = self._dump_paths[self._dump_index]
+        self._dump_index ^= 1
+        return path
+    
+    def _write_dump(self, path: str, data: bytes):
+        """Write a debug screenshot (runs on the I/O pool)."""
+        with open(path, 'wb') as f:
+            f.write(data)
+    
+    def dump_hierarchy(self, force: bool = False) -> Optional[str]:
         """
         Dump UI hierarchy XML.
         
+        The XML is kept in memory (last_hierarchy_xml); it is only
+        written to hierarchy_path in debug mode. A dump younger than
+        hierarchy_ttl with no action since is reused unless forced.
+        
+        Args:
+            force: Always fetch a fresh dump from the device
+            
         Returns:
-            Path to saved XML file
+            XML content, or None on failure
         """
+        dumped_at, dumped_count = self._hierarchy_stamp
+        if (not force and self.last_hierarchy_xml is not None
+                and dumped_count == self.action_count
+                and time.monotonic() - dumped_at < self.hierarchy_ttl):
+            return self.last_hierarchy_xml
+        
         try:
-            xml_content = self.device.dump_hierarchy()
-            with open(self.hierarchy_path, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
-            print(f"🌳 Hierarchy: {self.hierarchy_path}")
-            return self.hierarchy_path
+            xml_content = self._fetch_hierarchy()
+            if self.debug:
+                with open(self.hierarchy_path, 'w', encoding='utf-8') as f:
+                    f.write(xml_content)
+            log.debug("🌳 Hierarchy: %s KB", len(xml_content) // 1024)
+            return xml_content
         except Exception as e:
-            print(f"❌ Hierarchy dump failed: {e}")
+            log.error("❌ Hierarchy dump failed: %s", e)
             return None
     
     # ==================== Actions ====================
@@ -97,11 +252,12 @@ class DeviceController:
             Success status
         """
         try:
+            self.action_count += 1
             self.device.click(x, y)
-            print(f"👆 Clicked: ({x}, {y})")
+            log.debug("👆 Clicked: (%d, %d)", x, y)
             return True
         except Exception as e:
-            print(f"❌ Click failed: {e}")
+            log.error("❌ Click failed: %s", e)
             return False
     
     def type_text(self, text: str) -> bool:
@@ -115,11 +271,12 @@ class DeviceController:
             Success status
         """
         try:
+            self.action_count += 1
             self.device.send_keys(text)
-            print(f"⌨️  Typed: {text}")
+            log.debug("⌨️  Typed: %s", text)
             return True
         except Exception as e:
-            print(f"❌ Typing failed: {e}")
+            log.error("❌ Typing failed: %s", e)
         return False
     
     def scroll(self, direction: str = "down") -> bool:
@@ -133,35 +290,19 @@ class DeviceController:
             Success status
         """
         try:
-            if direction == "down":
-                self.device.swipe(
-                    self.screen_width // 2, self.screen_height * 2 // 3,
-                    self.screen_width // 2, self.screen_height // 3,
-                    0.3
-                )
-            elif direction == "up":
-                self.device.swipe(
-                    self.screen_width // 2, self.screen_height // 3,
-                    self.screen_width // 2, self.screen_height * 2 // 3,
-                    0.3
-                )
-            elif direction == "left":
-                self.device.swipe(
-                    self.screen_width * 2 // 3, self.screen_height // 2,
-                    self.screen_width // 3, self.screen_height // 2,
-                    0.3
-                )
-            elif direction == "right":
-                self.device.swipe(
-                    self.screen_width // 3, self.screen_height // 2,
-                    self.screen_width * 2 // 3, self.screen_height // 2,
-                    0.3
-                )
+            coords = self._swipe_coords[direction]
+        except KeyError:
+            log.error("❌ Scroll failed: unknown direction '%s'", direction)
+            return False
+        
+        try:
+            self.action_count += 1
+            self.device.swipe(*coords)
             
-            print(f"📜 Scrolled: {direction}")
+            log.debug("📜 Scrolled: %s", direction)
             return True
         except Exception as e:
-            print(f"❌ Scroll failed: {e}")
+            log.error("❌ Scroll failed: %s", e)
             return False
     
     def swipe(self, direction: str) -> bool:
@@ -187,19 +328,134 @@ class DeviceController:
             Success status
         """
         try:
+            self.action_count += 1
             self.device.press(key)
-            print(f"🔘 Pressed: {key}")
+            log.debug("🔘 Pressed: %s", key)
             return True
         except Exception as e:
-            print(f"❌ Key press failed: {e}")
+            log.error("❌ Key press failed: %s", e)
             return False
     
+    def batch_actions(self, actions: List[Dict]) -> int:
+        """
+        Run several non-interactive actions in one adb shell round trip.
+        
+        Commands are chained with && and each echoes a marker when it
+        succeeds, so a failure mid-chain still reports how far it got.
+        
+        Args:
+            actions: Action dicts as returned by step_to_action(), plus
+                {"type": "tap", "x": int, "y": int} and {"type": "text", "text": str}
+            
+        Returns:
+            Number of leading actions that completed (len(actions) on success)
+        """
+        try:
+            commands = []
+            for action in actions:
+                kind = action["type"]
+                if kind == "key":
+                    commands.append(f"input keyevent {KEYCODES[action['key']]}")
+                elif kind == "tap":
+                    commands.append(f"input tap {action['x']} {action['y']}")
+                elif kind == "text":
+                    commands.append(f"input text {shlex.quote(action['text'].replace(' ', '%s'))}")
+                elif kind == "swipe":
+                    x1, y1, x2, y2, duration = self._swipe_coords[action["direction"]]
+                    commands.append(f"input swipe {x1} {y1} {x2} {y2} {int(duration * 1000)}")
+                else:
+                    raise ValueError(f"Unknown batch action: {kind}")
+                commands.append(f"echo {BATCH_MARKER}")
+            
+            self.action_count += len(actions)
+            result = self.device.shell(" && ".join(commands), timeout=10.0)
+            done = result.output.count(BATCH_MARKER)
+            if result.exit_code != 0:
+                log.error("❌ Batch failed after %s/%s actions (exit %s): %s",
+                          done, len(actions), result.exit_code, result.output.strip())
+                return done
+            
+            log.debug("⚡ Batched %s actions in one adb call", len(actions))
+            return len(actions)
+        except Exception as e:
+            log.error("❌ Batch failed: %s", e)
+            return 0
+    
     # ==================== Utilities ====================
     
     def wait(self, seconds: float):
         """Wait for specified duration."""
         time.sleep(seconds)
     
+    def wait_for_idle(self, max_ms: Optional[int] = None, stable_ms: Optional[int] = None) -> bool:
+        """
+        Wait until the UI settles instead of sleeping a fixed time.
+        
+        Polls the UI hierarchy and returns once it has stayed unchanged
+        for stable_ms. A poll is only started if it can finish before
+        max_ms; when dumps are too slow to detect idle within the budget,
+        this degrades to a plain max_ms sleep.
+        
+        Args:
+            max_ms: Upper bound on the wait (default: wait_for_idle_timeout)
+            stable_ms: How long the hierarchy must stay unchanged (default: wait_for_idle_stable)
+            
+        Returns:
+            True if the UI became idle, False on timeout
+        """
+        if max_ms is None:
+            max_ms = self.wait_for_idle_timeout
+        if stable_ms is None:
+            stable_ms = self.wait_for_idle_stable
+        
+        budget = max_ms / 1000
+        deadline = time.monotonic() + budget
+        stable_for = stable_ms / 1000
+        poll_interval = 0.08
+        
+        # Idle needs two dumps stable_ms apart; if that can't fit, just sleep
+        if 2 * self._dump_cost_s + stable_for > budget:
+            time.sleep(budget)
+            return False
+        
+        try:
+            last = self._hierarchy_digest()
+            stable_since = time.monotonic()
+            
+            # Only start a poll that can finish before the deadline
+            while time.monotonic() + poll_interval + self._dump_cost_s <= deadline:
+                time.sleep(poll_interval)
+                current = self._hierarchy_digest()
+                now = time.monotonic()
+                
+                if current != last:
+                    last = current
+                    stable_since = now
+                elif now - stable_since >= stable_for:
+                    return True
+        except Exception as e:
+            log.warning("⚠️  Idle detection failed, sleeping instead: %s", e)
+        
+        # Not idle yet: sleep out what is left of the budget
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return False
+    
+    def _hierarchy_digest(self) -> bytes:
+        """Cheap fingerprint of the current UI hierarchy (also times the dump)."""
+        start = time.monotonic()
+        xml_content = self._fetch_hierarchy()
+        self._dump_cost_s = time.monotonic() - start
+        return hashlib.blake2b(xml_content.encode('utf-8'), digest_size=16).digest()
+    
+    def _fetch_hierarchy(self) -> str:
+        """Fetch a fresh hierarchy dump and remember it for dump_hierarchy()."""
+        xml_content = self.device.dump_hierarchy()
+        self.last_hierarchy_xml = xml_content
+        self._hierarchy_stamp = (time.monotonic(), self.action_count)
+        return xml_content
+    
     def get_screen_size(self) -> Tuple[int, int]:
         """Get screen dimensions."""
         return (self.screen_width, self.screen_height)
@@ -231,69 +487,105 @@ class DeviceController:
             Success status
         """
         try:
-            step_lower = step.lower()
-            
-            # Type/Input action
-            if "type" in step_lower or "input" in step_lower or "enter" in step_lower:
-                text = self._extract_text(step)
-                if text:
-                    return self.type_text(text)
-                return False
-            
-            # Scroll/Swipe action
-            elif "scroll" in step_lower or "swipe" in step_lower:
-                direction = "down"  # default
-                if "up" in step_lower:
-                    direction = "up"
-                elif "left" in step_lower:
-                    direction = "left"
-                elif "right" in step_lower:
-                    direction = "right"
-                return self.scroll(direction)
-            
-            # Back/Home key press
-            elif "press" in step_lower or "back" in step_lower:
-                if "back" in step_lower:
-                    return self.press_key("back")
-                elif "home" in step_lower:
-                    return self.press_key("home")
-                elif "enter" in step_lower:
-                    return self.press_key("enter")
-                return False
-            
-            # Wait action
-            elif "wait" in step_lower:
-                seconds = self._extract_wait_time(step)
-                self.wait(seconds)
-                print(f"⏳ Waited {seconds}s")
-                return True
-            
-            # Default: Click action
-            else:
-                if pixel_coords:
-                    x, y = pixel_coords
-                    return self.click(x, y)
-                return False
+            tokens, kind = self._classify_step(step)
+            return self._action_handlers[kind](step, tokens, pixel_coords)
                 
         except Exception as e:
-            print(f"❌ Action failed: {e}")
+            log.error("❌ Action failed: %s", e)
             return False
     
+    def step_to_action(self, step: str) -> Optional[Dict]:
+        """
+        Translate a step into a batchable action, if it needs no screen.
+        
+        Args:
+            step: Natural language step
+            
+        Returns:
+            {"type": "swipe", "direction": str} / {"type": "key", "key": str},
+            or None for steps that need locating, typing or waiting
+        """
+        tokens, kind = self._classify_step(step)
+        if kind == "scroll":
+            return {"type": "swipe", "direction": self._scroll_direction(tokens)}
+        if kind == "key":
+            key = self._key_name(tokens)
+            return {"type": "key", "key": key} if key else None
+        return None
+    
+    def _classify_step(self, step: str) -> Tuple[Set[str], str]:
+        """Collect step keywords in one regex pass and pick the action kind."""
+        tokens = {t.lower() for t in STEP_TOKEN_RE.findall(step)}
+        kinds = {STEP_KINDS[t] for t in tokens if t in STEP_KINDS}
+        kind = next((k for k in STEP_KIND_PRIORITY if k in kinds), "click")
+        return tokens, kind
+    
+    def _scroll_direction(self, tokens: Set[str]) -> str:
+        """Scroll direction named in a step (default: down)."""
+        for direction in ("up", "left", "right"):
+            if direction in tokens:
+                return direction
+        return "down"
+    
+    def _key_name(self, tokens: Set[str]) -> Optional[str]:
+        """Device key named in a step."""
+        for key in ("back", "home", "enter"):
+            if key in tokens:
+                return key
+        return None
+    
+    def _perform_type(self, step: str, tokens: Set[str], pixel_coords) -> bool:
+        """Type/Input action."""
+        text = self._extract_text(step)
+        if text:
+            return self.type_text(text)
+        return False
+    
+    def _perform_scroll(self, step: str, tokens: Set[str], pixel_coords) -> bool:
+        """Scroll/Swipe action."""
+        return self.scroll(self._scroll_direction(tokens))
+    
+    def _perform_key(self, step: str, tokens: Set[str], pixel_coords) -> bool:
+        """Back/Home key press."""
+        key = self._key_name(tokens)
+        if key:
+            return self.press_key(key)
+        return False
+    
+    def _perform_wait(self, step: str, tokens: Set[str], pixel_coords) -> bool:
+        """
+        Wait action.
+        
+        "wait N" sleeps the full N seconds: a spinner or network fetch
+        often leaves the hierarchy unchanged, so idle detection would cut
+        it short. A bare "wait" waits for the UI to go idle (<= 2s).
+        """
+        start = time.monotonic()
+        if STEP_WAIT_RE.search(step):
+            self.wait(self._extract_wait_time(step))
+        else:
+            self.wait_for_idle(max_ms=int(self._extract_wait_time(step) * 1000))
+        log.debug("⏳ Waited %.1fs", time.monotonic() - start)
+        return True
+    
+    def _perform_click(self, step: str, tokens: Set[str], pixel_coords) -> bool:
+        """Default: Click action."""
+        if pixel_coords:
+            x, y = pixel_coords
+            return self.click(x, y)
+        return False
+    
     def _extract_text(self, step: str) -> Optional[str]:
         """Extract text to type from step."""
-        step_lower = step.lower()
-        keywords = ["type ", "input ", "enter ", "text "]
-        
-        for keyword in keywords:
-            if keyword in step_lower:
-                idx = step_lower.index(keyword) + len(keyword)
-                text = step[idx:].strip()
-                return text.replace(" and press enter", "").replace(" and send", "").strip()
+        match = STEP_TEXT_RE.search(step)
+        if match:
+            text = match.group(1).strip()
+            return text.replace(" and press enter", "").replace(" and send", "").strip()
         return None
     
     def _extract_wait_time(self, step: str) -> float:
         """Extract wait duration from step."""
-        match = re.search(r'wait\s+(\d+)', step.lower())
+        match = STEP_WAIT_RE.search(step)
         if match:
             return float(match.group(1))
         return 2.0  # default
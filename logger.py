@@ -0,0 +1,58 @@
+"""
+Logger - Centralized, non-blocking logging
+
+All modules log through the "andromator" logger:
+- Callers only enqueue records (QueueHandler), never touch stdout
+- A QueueListener thread writes them out
+- Level comes from ANDROMATOR_LOG_LEVEL (default INFO)
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+
+ROOT_LOGGER = "andromator"
+
+_listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a component logger under the shared "andromator" root.
+    
+    Args:
+        name: Component name (e.g. "device")
+        
+    Returns:
+        Configured logger
+    """
+    _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def _configure():
+    """Install the queue handler/listener once per process."""
+    global _listener
+    if _listener is not None:
+        return
+    
+    root = logging.getLogger(ROOT_LOGGER)
+    try:
+        root.setLevel(os.environ.get("ANDROMATOR_LOG_LEVEL", "INFO").upper())
+    except ValueError:
+        root.setLevel(logging.INFO)
+    
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+    
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -1,5 +1,6 @@
 """FastAPI Server for Pure Moondream Vision Intelligence."""
 
+import asyncio
 import os
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException
@@ -30,6 +31,19 @@ except Exception as e:
     print(f"❌ Failed to initialize Vision Agent: {e}")
     agent = None
 
+@app.on_event("startup")
+async def startup():
+    """Open the async Moondream client on the server's event loop."""
+    if agent:
+        await agent.vision.start_async()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the Moondream clients and agent worker threads."""
+    if agent:
+        await agent.vision.aclose()
+        agent.shutdown()
+
 # ==================== API Schemas ====================
 
 class TestRequest(BaseModel):
@@ -80,7 +94,7 @@ def health_check():
         "status": "healthy",
         "agent": "ready",
         "device_connected": agent.device is not None,
-        "screen_size": f"{agent.screen_width}x{agent.screen_height}"
+        "screen_size": f"{agent.device.screen_width}x{agent.device.screen_height}"
     }
 
 @app.get("/screen")
@@ -90,20 +104,20 @@ def get_current_screen():
         raise HTTPException(status_code=503, detail="Vision Agent not initialized")
     
     try:
-        screenshot_path = agent.capture_screen()
+        screenshot_path = agent.get_current_screen()
         return {
             "success": True,
             "screenshot_path": screenshot_path,
             "screen_size": {
-                "width": agent.screen_width,
-                "height": agent.screen_height
+                "width": agent.device.screen_width,
+                "height": agent.device.screen_height
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to capture screen: {str(e)}")
 
 @app.get("/parse_screen_llm")
-def parse_screen_for_llm():
+async def parse_screen_for_llm():
     """
     Parse screen into structured JSON optimized for LLM consumption.
     
@@ -119,11 +133,8 @@ def parse_screen_for_llm():
         raise HTTPException(status_code=503, detail="Vision Agent not initialized")
     
     try:
-        # Capture current screen
-        agent.capture_screen()
-        
-        # Parse with Moondream
-        result = agent.parse_screen_for_llm()
+        # Capture (or reuse a fresh) screen and parse with Moondream off the event loop
+        result = await asyncio.to_thread(agent.parse_screen_for_llm)
         
         if not result.get("success"):
             raise HTTPException(status_code=500, detail=result.get("error", "Screen parsing failed"))
@@ -135,7 +146,7 @@ def parse_screen_for_llm():
         raise HTTPException(status_code=500, detail=f"Failed to parse screen: {str(e)}")
 
 @app.post("/run_test")
-def run_test(request: TestRequest):
+async def run_test(request: TestRequest):
     """
     Execute a test case with natural language steps.
     
@@ -167,7 +178,7 @@ def run_test(request: TestRequest):
         }
         
         # Run test
-        result = agent.run_test_case(test_case)
+        result = await agent.run_test_case_async(test_case)
         
         return result
         
@@ -175,7 +186,7 @@ def run_test(request: TestRequest):
         raise HTTPException(status_code=500, detail=f"Test execution failed: {str(e)}")
 
 @app.post("/query_screen")
-def query_screen(question: str):
+async def query_screen(question: str):
     """
     Ask Moondream a question about the current screen.
     
@@ -185,23 +196,20 @@ def query_screen(question: str):
         raise HTTPException(status_code=503, detail="Vision Agent not initialized")
     
     try:
-        # Capture screen
-        screenshot_path = agent.capture_screen()
-        
-        # Query Moondream
-        result = agent.query_moondream(screenshot_path, question)
+        # Capture screen (in memory) and query Moondream
+        answer = await agent.query_screen_async(question)
         
-        if result.get("success"):
+        if answer is not None:
             return {
                 "success": True,
                 "question": question,
-                "answer": result["answer"]
+                "answer": answer
             }
         else:
             return {
                 "success": False,
                 "question": question,
-                "error": result.get("error", "Unknown error")
+                "error": "Moondream query failed"
             }
             
     except Exception as e:
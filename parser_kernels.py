@@ -0,0 +1,81 @@
+"""
+Parser Kernels - Optional Numba-compiled pixel loops
+
+Used by ScreenParser when OpenCV is not installed:
+- Area (box-filter) downscale of uint8 RGB/BGR frames
+
+Numba is optional. Without it, `downscale` is None and callers keep
+using PIL.
+"""
+
+try:
+    import numpy as np
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def downscale_area_u8(src, out):
+        """
+        Area-resample src (H, W, C uint8) into out (h, w, C uint8).
+
+        Each output pixel is the coverage-weighted mean of the source
+        pixels under its footprint (like cv2 INTER_AREA), so thin lines
+        and small text don't alias away. Output rows are split across
+        threads with prange.
+        """
+        src_h, src_w, channels = src.shape
+        out_h, out_w = out.shape[0], out.shape[1]
+        scale_y = src_h / out_h
+        scale_x = src_w / out_w
+        inv_area = 1.0 / (scale_y * scale_x)
+
+        for y in prange(out_h):
+            y_start = y * scale_y
+            y_end = y_start + scale_y
+            iy0 = int(y_start)
+            iy1 = min(int(np.ceil(y_end)), src_h)
+
+            for x in range(out_w):
+                x_start = x * scale_x
+                x_end = x_start + scale_x
+                ix0 = int(x_start)
+                ix1 = min(int(np.ceil(x_end)), src_w)
+
+                for c in range(channels):
+                    total = 0.0
+                    for sy in range(iy0, iy1):
+                        wy = min(sy + 1.0, y_end) - max(float(sy), y_start)
+                        row = 0.0
+                        for sx in range(ix0, ix1):
+                            wx = min(sx + 1.0, x_end) - max(float(sx), x_start)
+                            row += src[sy, sx, c] * wx
+                        total += row * wy
+                    out[y, x, c] = np.uint8(min(total * inv_area + 0.5, 255.0))
+
+    def _downscale(pixels, long_edge: int) -> "np.ndarray":
+        """
+        Shrink a frame so its longer side is at most long_edge.
+
+        Args:
+            pixels: (H, W, C) uint8 array, or anything np.asarray accepts (e.g. a PIL image)
+            long_edge: Maximum output size of the longer side in pixels
+
+        Returns:
+            Contiguous uint8 array (the input itself if already small enough)
+        """
+        src = np.ascontiguousarray(pixels, dtype=np.uint8)
+        height, width = src.shape[:2]
+        scale = long_edge / max(height, width)
+        if scale >= 1:
+            return src
+
+        out = np.empty((max(1, round(height * scale)), max(1, round(width * scale)), src.shape[2]), np.uint8)
+        downscale_area_u8(src, out)
+        return out
+
+    downscale = _downscale
+else:
+    downscale = None
@@ -8,34 +8,159 @@ Handles all visual understanding:
 - Visual reasoning
 """
 
+import asyncio
 import base64
+import hashlib
 import json
-import urllib.request
-from typing import Optional, Dict
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, List, Tuple, Union
 from PIL import Image
 import io
-from stats_tracker import StatsTracker
+import httpx
+import urllib3
+from urllib3 import encode_multipart_formdata
+from stats_tracker import DetectionSource, StatsTracker
+from logger import get_logger
+
+log = get_logger("vision")
+
+# Optional SIMD fast path: NumPy/OpenCV pixel ops + libjpeg-turbo encode
+try:
+    import numpy as np
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Numba resize kernel, only needed (and only imported) without OpenCV
+if cv2 is None:
+    from parser_kernels import downscale as _numba_downscale
+else:
+    _numba_downscale = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+except ImportError:
+    TurboJPEG = None
+
+# Optional fast JSON (falls back to stdlib)
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+    
+    _json_loads = json.loads
+
+# Optional XXH3/BLAKE3 for screenshot digests (falls back to BLAKE2b)
+try:
+    from xxhash import xxh3_64 as _screen_hasher
+except ImportError:
+    try:
+        from blake3 import blake3 as _screen_hasher
+    except ImportError:
+        def _screen_hasher(data: bytes):
+            return hashlib.blake2b(data, digest_size=16)
+
+# HTTP statuses worth retrying (rate limit / transient server errors)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Navigation answers: an action verb up to the end of its sentence
+NAV_ACTION_RE = re.compile(r'\b(?:scroll|swipe|press|click)\b[^\n".]*|\bnot possible\b')
+
+# Screenshot on disk (path), in memory (PNG/JPEG bytes) or a decoded BGR frame
+ScreenImage = Union[str, bytes, "np.ndarray"]
+
+
+class MoondreamAPIError(Exception):
+    """Non-2xx response from the Moondream API."""
+    
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
 
 
 class ScreenParser:
     """Manages visual understanding via Moondream."""
     
-    def __init__(self, api_key: str, stats: Optional[StatsTracker] = None):
+    def __init__(self, api_key: str, stats: Optional[StatsTracker] = None,
+                 epoch: Optional[Callable[[], int]] = None):
         """
         Initialize screen parser.
         
         Args:
             api_key: Moondream API key
             stats: Optional stats tracker
+            epoch: Optional counter that changes after every device action;
+                mixed into result-cache keys so answers never outlive an action
         """
         self.api_key = api_key
         self.query_url = "https://api.moondream.ai/v1/query"
         self.point_url = "https://api.moondream.ai/v1/point"
         self.stats = stats or StatsTracker()
+        
+        # Encoded screenshots keyed by (path or bytes hash, long_edge, quality) -> (stamp, JPEG bytes)
+        self._img_cache: "OrderedDict[object, tuple]" = OrderedDict()
+        self._img_cache_size = 8
+        self._img_lock = threading.Lock()  # locate and speculative queries encode concurrently
+        
+        # Moondream answers keyed by (kind, screenshot digest, epoch, text)
+        self._result_cache: "OrderedDict[tuple, object]" = OrderedDict()
+        self._result_cache_size = 128
+        self._result_lock = threading.Lock()
+        self._epoch = epoch or (lambda: 0)
+        self._last_digest: Tuple[Optional[bytes], bytes] = (None, b"")  # (encoded image, digest)
+        
+        # Upload size: the longer screen side is scaled down to these
+        # limits. Yes/no and navigation questions need the least detail;
+        # /v1/point keeps enough for button-sized targets
+        self.query_long_edge = 768
+        self.query_quality = 70
+        self.point_long_edge = 1280
+        self.point_quality = 85
+        
+        # Shared worker pool for concurrent Moondream requests
+        self._pool = ThreadPoolExecutor(max_workers=4)
+        
+        # Persistent keep-alive connections; transient failures are
+        # retried here so the image is never re-encoded
+        self._http = urllib3.PoolManager(
+            num_pools=2,
+            maxsize=8,
+            retries=urllib3.Retry(
+                total=2,
+                backoff_factor=0.25,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,
+                raise_on_status=False
+            )
+        )
+        
+        # Async HTTP/2 client, opened by start_async() on the server's loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Upload mode: None until the first response tells us whether
+        # the API accepts multipart JPEG; False -> base64 JSON
+        self._use_multipart: Optional[bool] = None
+        
+        # libjpeg-turbo encoder (None -> fall back to PIL)
+        self._tj = None
+        if TurboJPEG is not None and cv2 is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                log.warning("⚠️  libjpeg-turbo unavailable, using PIL: %s", e)
     
     # ==================== Vision Intelligence ====================
     
-    def query(self, image_path: str, question: str, retry: int = 1) -> Optional[str]:
+    def query(self, image: ScreenImage, question: str) -> Optional[str]:
         """
         Ask Moondream a question about the screen.
         
@@ -46,56 +171,31 @@ class ScreenParser:
         - General reasoning
         
         Args:
-            image_path: Path to screenshot
+            image: Screenshot path or bytes
             question: Question to ask
-            retry: Retry attempt number
             
         Returns:
             Answer string or None
         """
+        return self._query(image, question)[0]
+    
+    def _query(self, image: ScreenImage, question: str) -> Tuple[Optional[str], bool]:
+        """query(), also reporting whether the answer came from the result cache."""
         try:
-            # Optimize image
-            encoded_image = self._optimize_image(image_path)
-            
-            # Build request
-            payload = {
-                "image": encoded_image,
-                "question": question
-            }
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            # Make request
-            req = urllib.request.Request(
-                self.query_url,
-                data=json.dumps(payload).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-            
-            # Record stats
-            self.stats.record_query_call()
-            
-            # Execute
-            with urllib.request.urlopen(req, timeout=15) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                answer = result.get('answer', '')
-                return answer
+            image_bytes = self._prepare_payload(image, for_query=True)
+            key = self._result_key("query", image_bytes, question)
+            answer = self._cache_get(key)
+            if answer is not None:
+                return answer, True
+            answer = self._call(self._post_query, image_bytes, question)
+            self._cache_put(key, answer)
+            return answer, False
             
         except Exception as e:
-            print(f"❌ Moondream query error (attempt {retry}): {e}")
-            
-            if retry < 3:
-                import time
-                time.sleep(1)
-                return self.query(image_path, question, retry + 1)
-            
-            return None
+            log.error("❌ Moondream query error: %s", e)
+            return None, False
     
-    def locate(self, image_path: str, element_description: str, retry: int = 1) -> Optional[Dict]:
+    def locate(self, image: ScreenImage, element_description: str) -> Optional[Dict]:
         """
         Locate element and get coordinates.
         
@@ -104,88 +204,123 @@ class ScreenParser:
         - Getting normalized coordinates
         
         Args:
-            image_path: Path to screenshot
+            image: Screenshot path or bytes
             element_description: What to locate
-            retry: Retry attempt number
             
         Returns:
             Dict with {'x': float, 'y': float} or None
         """
         try:
-            # Optimize image
-            encoded_image = self._optimize_image(image_path)
-            
-            # Build request
-            payload = {
-                "image": encoded_image,
-                "object": element_description
-            }
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            # Make request
-            req = urllib.request.Request(
-                self.point_url,
-                data=json.dumps(payload).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-            
-            # Record stats
-            self.stats.record_point_call()
-            self.stats.record_detection("moondream")
-            
-            # Execute
-            with urllib.request.urlopen(req, timeout=15) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                
-                # Moondream returns [x, y] array
-                if 'point' in result and isinstance(result['point'], list) and len(result['point']) == 2:
-                    x, y = result['point']
-                    print(f"✅ Moondream located: '{element_description}' at ({x:.3f}, {y:.3f})")
-                    return {"x": x, "y": y}
-                
-                return None
+            image_bytes = self._prepare_payload(image)
+            key = self._result_key("point", image_bytes, element_description)
+            coords = self._cache_get(key)
+            if coords is None:
+                coords = self._call(self._post_point, image_bytes, element_description)
+                self._cache_put(key, coords)
+            return coords
             
         except Exception as e:
-            print(f"❌ Moondream locate error (attempt {retry}): {e}")
+            log.error("❌ Moondream locate error: %s", e)
+            return None
+    
+    def query_and_locate(self, image: ScreenImage, question: str,
+                         element_description: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Run a /v1/query and a /v1/point call on the same screen concurrently.
+        
+        Both requests are issued in parallel through query() and
+        locate(), so the step pays for one round trip instead of two
+        and cached answers are reused.
+        
+        Args:
+            image: Screenshot path or bytes
+            question: Question to ask
+            element_description: What to locate
             
-            if retry < 3:
-                import time
-                time.sleep(1)
-                return self.locate(image_path, element_description, retry + 1)
+        Returns:
+            (answer or None, {'x': float, 'y': float} or None)
+        """
+        query_future = self._pool.submit(self.query, image, question)
+        point_future = self._pool.submit(self.locate, image, element_description)
+        return query_future.result(), point_future.result()
+    
+    def locate_many(self, image: ScreenImage, descriptions: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Locate several elements on the same screen.
+        
+        Tries a single /v1/query asking for every element's coordinates
+        as JSON. Anything missing or unparseable falls back to /v1/point
+        calls, issued in parallel with the image encoded only once.
+        
+        Args:
+            image: Screenshot path or bytes
+            descriptions: Elements to locate
             
-            return None
+        Returns:
+            Dict mapping each description to {'x': float, 'y': float} or None
+        """
+        results: Dict[str, Optional[Dict]] = {d: None for d in descriptions}
+        if not descriptions:
+            return results
+        
+        try:
+            image_bytes = self._prepare_payload(image)
+        except Exception as e:
+            log.error("❌ Image optimization failed: %s", e)
+            return results
+        
+        # 1. Cached /v1/point answers for this screen
+        point_keys = {d: self._result_key("point", image_bytes, d) for d in descriptions}
+        for description, key in point_keys.items():
+            results[description] = self._cache_get(key)
+        missing = [d for d in descriptions if results[d] is None]
+        
+        # 2. Batched: one query for all remaining elements
+        if len(missing) > 1:
+            try:
+                results.update(self._query_points(image_bytes, missing))
+            except Exception as e:
+                log.warning("⚠️  Batched locate failed, falling back to /v1/point: %s", e)
+        
+        # 3. Fallback: parallel point calls for whatever is still missing
+        missing = [d for d in missing if results[d] is None]
+        futures = {d: self._pool.submit(self._call, self._post_point, image_bytes, d) for d in missing}
+        for description, future in futures.items():
+            try:
+                results[description] = future.result()
+                self._cache_put(point_keys[description], results[description])
+            except Exception as e:
+                log.error("❌ Moondream locate error: %s", e)
+        
+        return results
     
-    def check_visibility(self, image_path: str, element_name: str) -> bool:
+    def check_visibility(self, image: ScreenImage, element_name: str) -> bool:
         """
         Check if element is visible on screen.
         
         Args:
-            image_path: Path to screenshot
+            image: Screenshot path or bytes
             element_name: Element to check
             
         Returns:
             True if visible
         """
         question = f"Is the {element_name} visible on this screen? Answer only 'yes' or 'no'."
-        answer = self.query(image_path, question)
+        answer, cached = self._query(image, question)
         
         if answer:
-            self.stats.record_reasoning_call()
+            if not cached:
+                self.stats.record_reasoning_call()
             return "yes" in answer.lower()
         
         return False
     
-    def get_navigation_suggestion(self, image_path: str, goal: str) -> Optional[str]:
+    def get_navigation_suggestion(self, image: ScreenImage, goal: str) -> Optional[str]:
         """
         Get navigation suggestion from Moondream.
         
         Args:
-            image_path: Path to screenshot
+            image: Screenshot path or bytes
             goal: What element to find
             
         Returns:
@@ -205,10 +340,11 @@ class ScreenParser:
         Answer with just the action, nothing else.
         """
         
-        answer = self.query(image_path, question)
+        answer, cached = self._query(image, question)
         
         if answer:
-            self.stats.record_reasoning_call()
+            if not cached:
+                self.stats.record_reasoning_call()
             action = answer.strip().lower()
             
             # Validate action
@@ -217,54 +353,589 @@ class ScreenParser:
         
         return None
     
-    def validate_action(self, image_path: str, expectation: str) -> bool:
+    def visibility_and_suggestion(self, image: ScreenImage, element: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check visibility and get a navigation suggestion in one query.
+        
+        Args:
+            image: Screenshot path or bytes
+            element: Element to find
+            
+        Returns:
+            (visible, action) - action is None when visible or no move helps
+        """
+        question = f"""
+        Is the '{element}' visible on this screen?
+        If it is not, what single action should I take to find it?
+        
+        Respond with ONLY a JSON object:
+        {{"visible": true or false, "action": ACTION or null}}
+        
+        ACTION must be one of:
+        - "scroll down"
+        - "scroll up"
+        - "press back"
+        - "click [specific element name]"
+        - "not possible"
+        """
+        
+        answer, cached = self._query(image, question)
+        if not answer:
+            return False, None
+        
+        if not cached:
+            self.stats.record_reasoning_call()
+        visible, action = self._parse_visibility(answer)
+        
+        if action and not any(cmd in action for cmd in ["scroll", "click", "press", "swipe", "not possible"]):
+            action = None
+        
+        return visible, None if visible else action
+    
+    def validate_action(self, image: ScreenImage, expectation: str) -> bool:
         """
         Validate that action had expected result.
         
         Args:
-            image_path: Path to screenshot (after action)
+            image: Screenshot path or bytes (after action)
             expectation: What to check
             
         Returns:
             True if validation passed
         """
         question = f"Looking at this screen: {expectation}? Answer only 'yes' or 'no'."
-        answer = self.query(image_path, question)
+        answer = self.query(image, question)
         
         if answer:
             return "yes" in answer.lower()
         
         return False
     
+    def parse_screen(self, image: ScreenImage) -> Optional[Dict]:
+        """
+        Describe the screen as structured JSON for downstream LLMs.
+        
+        Args:
+            image: Screenshot path or bytes
+            
+        Returns:
+            {"app_context", "interactive_elements", "visible_content"} or None
+        """
+        question = """
+        Describe this mobile screen. Return ONLY a JSON object:
+        {
+          "app_context": {"app_name": str, "screen_type": str, "purpose": str},
+          "interactive_elements": [{"name": str, "type": "button"|"input"|"link"|"toggle"|"other"}],
+          "visible_content": [str]
+        }
+        """
+        
+        answer = self.query(image, question)
+        match = re.search(r"\{.*\}", answer or "", re.DOTALL)
+        if not match:
+            return None
+        
+        try:
+            result = _json_loads(match.group(0))
+        except ValueError:
+            return None
+        return result if isinstance(result, dict) else None
+    
+    # ==================== Async API ====================
+    
+    async def start_async(self):
+        """Open the shared HTTP/2 client on the running event loop."""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                http2=True,
+                timeout=15.0,
+                limits=httpx.Limits(max_connections=32)
+            )
+            self._async_loop = asyncio.get_running_loop()
+    
+    async def aclose(self):
+        """Close the async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+    
+    async def query_async(self, image: ScreenImage, question: str) -> Optional[str]:
+        """
+        Async version of query().
+        
+        Uses the HTTP/2 client when it was opened on this event loop;
+        otherwise runs the sync query() in a worker thread.
+        
+        Args:
+            image: Screenshot path or bytes
+            question: Question to ask
+            
+        Returns:
+            Answer string or None
+        """
+        if not self._async_ready():
+            return await asyncio.to_thread(self.query, image, question)
+        
+        try:
+            image_bytes = await asyncio.to_thread(self._prepare_payload, image, True)
+            key = self._result_key("query", image_bytes, question)
+            answer = self._cache_get(key)
+            if answer is None:
+                self.stats.record_query_call()
+                result = await self._call_async(self.query_url, image_bytes, {"question": question})
+                answer = result.get('answer', '')
+                self._cache_put(key, answer)
+            return answer
+            
+        except Exception as e:
+            log.error("❌ Moondream query error: %s", e)
+            return None
+    
+    async def locate_async(self, image: ScreenImage, element_description: str) -> Optional[Dict]:
+        """
+        Async version of locate().
+        
+        Args:
+            image: Screenshot path or bytes
+            element_description: What to locate
+            
+        Returns:
+            Dict with {'x': float, 'y': float} or None
+        """
+        if not self._async_ready():
+            return await asyncio.to_thread(self.locate, image, element_description)
+        
+        try:
+            image_bytes = await asyncio.to_thread(self._prepare_payload, image)
+            key = self._result_key("point", image_bytes, element_description)
+            coords = self._cache_get(key)
+            if coords is None:
+                self.stats.record_point_call()
+                self.stats.record_detection(DetectionSource.MOONDREAM)
+                result = await self._call_async(self.point_url, image_bytes, {"object": element_description})
+                coords = self._parse_point(result, element_description)
+                self._cache_put(key, coords)
+            return coords
+            
+        except Exception as e:
+            log.error("❌ Moondream locate error: %s", e)
+            return None
+    
+    def close(self):
+        """Release pooled connections and worker threads."""
+        self._pool.shutdown(wait=False)
+        self._http.clear()
+        log.debug("🔌 Moondream connection pool closed")
+    
     # ==================== Helper Methods ====================
     
-    def _optimize_image(self, image_path: str) -> str:
+    def _result_key(self, kind: str, image_bytes: bytes, text: str) -> tuple:
+        """Cache key for a Moondream answer on this exact screen and device state."""
+        # _prepare_payload hands back the same bytes object for an unchanged
+        # screen, so hash each encoded screenshot only once
+        last_bytes, digest = self._last_digest
+        if image_bytes is not last_bytes:
+            digest = _screen_hasher(image_bytes).digest()
+            self._last_digest = (image_bytes, digest)
+        return (kind, digest, self._epoch(), text)
+    
+    def _cache_get(self, key: tuple):
+        """Look up a cached answer (None on miss)."""
+        with self._result_lock:
+            value = self._result_cache.get(key)
+            if value is not None:
+                self._result_cache.move_to_end(key)
+        if value is not None:
+            self.stats.record_cache_hit()
+        return value
+    
+    def _cache_put(self, key: tuple, value):
+        """Store a successful answer (bounded LRU)."""
+        if value is None:
+            return
+        with self._result_lock:
+            self._result_cache[key] = value
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self._result_cache_size:
+                self._result_cache.popitem(last=False)
+    
+    def _call(self, post_fn, image_bytes: bytes, *args, attempts: int = 3):
+        """
+        Run a Moondream request with retries on the already-encoded image.
+        
+        Transport errors and 429/5xx are retried inside the urllib3 pool;
+        this loop covers what escapes it (e.g. a truncated or garbled
+        response body) with exponential backoff, without re-encoding.
+        
+        Args:
+            post_fn: _post_query or _post_point
+            image_bytes: Optimized JPEG bytes
+            *args: Remaining arguments for post_fn
+            attempts: Maximum attempts
+            
+        Returns:
+            Whatever post_fn returns
+        """
+        for attempt in range(attempts):
+            try:
+                return post_fn(image_bytes, *args)
+            except (MoondreamAPIError, urllib3.exceptions.MaxRetryError):
+                # Client error or pool retries already exhausted
+                raise
+            except Exception as e:
+                if attempt == attempts - 1:
+                    raise
+                log.warning("⚠️  Moondream request failed (attempt %s/%s): %s", attempt + 1, attempts, e)
+                time.sleep(0.25 * 2 ** attempt)
+    
+    def _send(self, url: str, body: bytes, content_type: str) -> Dict:
+        """
+        POST a request body over the pooled connection.
+        
+        Args:
+            url: Endpoint URL
+            body: Encoded request body
+            content_type: Content-Type header
+            
+        Returns:
+            Decoded JSON response
+        """
+        headers = {
+            "Content-Type": content_type,
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        self.stats.record_upload(len(body))
+        resp = self._http.request('POST', url, body=body, headers=headers, timeout=15.0)
+        return self._decode_response(resp.status, resp.data)
+    
+    def _decode_response(self, status: int, data: bytes) -> Dict:
+        """Raise on HTTP errors, otherwise decode the JSON body."""
+        if status >= 400:
+            raise MoondreamAPIError(status, data.decode('utf-8', 'replace'))
+        return _json_loads(data)
+    
+    def _post(self, url: str, payload: Dict) -> Dict:
+        """
+        POST a JSON payload to a Moondream endpoint.
+        
+        Args:
+            url: Endpoint URL
+            payload: Request body
+            
+        Returns:
+            Decoded JSON response
+        """
+        return self._send(url, _json_dumps(payload), "application/json")
+    
+    def _post_image(self, url: str, image_bytes: bytes, fields: Dict) -> Dict:
+        """
+        POST a JPEG plus form fields to a Moondream endpoint.
+        
+        Sends raw bytes as multipart/form-data, which skips base64
+        and uploads ~25% less. Until multipart has worked once, any
+        failed multipart upload is retried once as base64 JSON; if
+        that succeeds, base64 JSON is used for good.
+        
+        Args:
+            url: Endpoint URL
+            image_bytes: JPEG bytes
+            fields: Extra form fields (question/object)
+            
+        Returns:
+            Decoded JSON response
+        """
+        if self._use_multipart is not False:
+            body, content_type = self._multipart_body(image_bytes, fields)
+            
+            try:
+                result = self._send(url, body, content_type)
+            except (MoondreamAPIError, urllib3.exceptions.MaxRetryError) as e:
+                self._check_multipart_failed(e)
+            else:
+                self._use_multipart = True
+                return result
+        
+        payload = {"image": self._to_base64(image_bytes), **fields}
+        result = self._post(url, payload)
+        self._pin_json_uploads()
+        return result
+    
+    def _multipart_body(self, image_bytes: bytes, fields: Dict) -> Tuple[bytes, str]:
+        """Build a multipart/form-data body with the JPEG and form fields."""
+        return encode_multipart_formdata({
+            "image": ("screen.jpg", image_bytes, "image/jpeg"),
+            **fields
+        })
+    
+    def _check_multipart_failed(self, e: Exception):
+        """Re-raise if multipart is known to work, else let the caller retry as base64 JSON."""
+        if self._use_multipart:
+            raise e
+        log.warning("⚠️  Multipart upload failed (%s), retrying as base64 JSON", e)
+    
+    def _pin_json_uploads(self):
+        """Stick with base64 JSON once it worked where multipart had not."""
+        if self._use_multipart is None:
+            log.info("📦 Base64 JSON upload accepted, disabling multipart")
+            self._use_multipart = False
+    
+    async def _send_async(self, url: str, body: bytes, content_type: str) -> Dict:
+        """POST a request body over the async HTTP/2 client."""
+        headers = {
+            "Content-Type": content_type,
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        self.stats.record_upload(len(body))
+        resp = await self._async_client.post(url, content=body, headers=headers)
+        return self._decode_response(resp.status_code, resp.content)
+    
+    async def _post_image_async(self, url: str, image_bytes: bytes, fields: Dict) -> Dict:
+        """Async version of _post_image()."""
+        if self._use_multipart is not False:
+            body, content_type = self._multipart_body(image_bytes, fields)
+            
+            try:
+                result = await self._send_async(url, body, content_type)
+            except MoondreamAPIError as e:
+                self._check_multipart_failed(e)
+            else:
+                self._use_multipart = True
+                return result
+        
+        payload = {"image": self._to_base64(image_bytes), **fields}
+        result = await self._send_async(url, _json_dumps(payload), "application/json")
+        self._pin_json_uploads()
+        return result
+    
+    async def _call_async(self, url: str, image_bytes: bytes, fields: Dict, attempts: int = 3) -> Dict:
+        """Async request with retries on transient errors (no re-encoding)."""
+        for attempt in range(attempts):
+            try:
+                return await self._post_image_async(url, image_bytes, fields)
+            except Exception as e:
+                retryable = not isinstance(e, MoondreamAPIError) or e.status in RETRY_STATUSES
+                if not retryable or attempt == attempts - 1:
+                    raise
+                log.warning("⚠️  Moondream request failed (attempt %s/%s): %s", attempt + 1, attempts, e)
+                await asyncio.sleep(0.25 * 2 ** attempt)
+    
+    def _async_ready(self) -> bool:
+        """Whether the async client belongs to the current event loop."""
+        if self._async_client is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._async_loop
+        except RuntimeError:
+            return False
+    
+    def _post_query(self, image_bytes: bytes, question: str) -> str:
+        """Send an already-encoded image to /v1/query."""
+        # Record stats
+        self.stats.record_query_call()
+        
+        result = self._post_image(self.query_url, image_bytes, {"question": question})
+        return result.get('answer', '')
+    
+    def _post_point(self, image_bytes: bytes, element_description: str) -> Optional[Dict]:
+        """Send an already-encoded image to /v1/point."""
+        # Record stats
+        self.stats.record_point_call()
+        self.stats.record_detection(DetectionSource.MOONDREAM)
+        
+        result = self._post_image(self.point_url, image_bytes, {"object": element_description})
+        return self._parse_point(result, element_description)
+    
+    def _parse_point(self, result: Dict, element_description: str) -> Optional[Dict]:
+        """Extract normalized coordinates from a /v1/point response."""
+        # Moondream returns [x, y] array
+        if 'point' in result and isinstance(result['point'], list) and len(result['point']) == 2:
+            x, y = result['point']
+            log.debug("✅ Moondream located: '%s' at (%.3f, %.3f)", element_description, x, y)
+            return {"x": x, "y": y}
+        
+        return None
+    
+    def _query_points(self, image_bytes: bytes, descriptions: List[str]) -> Dict[str, Dict]:
+        """Ask /v1/query for several element positions as one JSON object."""
+        listing = "\n".join(f"- {d}" for d in descriptions)
+        question = f"""
+        Find these elements on the screen:
+        {listing}
+        
+        Return ONLY a JSON object mapping each element name exactly as
+        written to its center as [x, y], normalized between 0 and 1.
+        Use null for elements that are not visible.
+        """
+        
+        key = self._result_key("query", image_bytes, question)
+        answer = self._cache_get(key)
+        if answer is None:
+            answer = self._call(self._post_query, image_bytes, question)
+            self._cache_put(key, answer)
+        match = re.search(r"\{.*\}", answer or "", re.DOTALL)
+        if not match:
+            return {}
+        
+        points = {}
+        for description, point in _json_loads(match.group(0)).items():
+            if (description in descriptions and isinstance(point, list) and len(point) == 2
+                    and all(isinstance(v, (int, float)) and not isinstance(v, bool) and 0 <= v <= 1 for v in point)):
+                points[description] = {"x": float(point[0]), "y": float(point[1])}
+        
+        return points
+    
+    def _parse_visibility(self, answer: str) -> Tuple[bool, Optional[str]]:
+        """Read {"visible", "action"} from a query answer, tolerating loose JSON."""
+        match = re.search(r"\{.*\}", answer, re.DOTALL)
+        if match:
+            try:
+                result = _json_loads(match.group(0))
+                action = result.get("action")
+                action = action.strip().lower() if isinstance(action, str) else None
+                return self._as_bool(result.get("visible")), action
+            except (ValueError, AttributeError):
+                pass
+        
+        # Regex recovery for answers that aren't valid JSON
+        text = answer.strip().lower()
+        visible = (re.search(r'"?visible"?\s*:\s*"?(true|yes)\b', text) is not None
+                   or text.startswith("yes"))
+        action = re.search(r'"?action"?\s*:\s*"([^"]+)"', text)
+        if action:
+            return visible, action.group(1).strip()
+        
+        # Bare answer such as "scroll down" or "No. press back"
+        action = NAV_ACTION_RE.search(text)
+        return visible, action.group(0).strip() if action else None
+    
+    @staticmethod
+    def _as_bool(value) -> bool:
+        """Coerce a JSON flag that may arrive as "true"/"false"/"yes"/"no"."""
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "yes", "1")
+        return bool(value)
+    
+    def _prepare_payload(self, image: ScreenImage, for_query: bool = False) -> bytes:
+        """
+        Encode a screenshot at the upload size for its endpoint.
+        
+        Args:
+            image: Screenshot path, bytes or BGR frame
+            for_query: Use the smaller /v1/query size instead of /v1/point
+            
+        Returns:
+            JPEG bytes (cached per screen)
+        """
+        if for_query:
+            return self._optimize_image(image, self.query_long_edge, self.query_quality)
+        return self._optimize_image(image, self.point_long_edge, self.point_quality)
+    
+    def _optimize_image(self, image: ScreenImage, long_edge: int = 1280, quality: int = 85) -> bytes:
         """
         Optimize image for API (resize + JPEG).
         
+        Results are cached and reused while the file's mtime and size
+        (or the in-memory bytes/frame) are unchanged, so back-to-back
+        calls on the same screenshot only encode it once per size/quality.
+        
         Args:
-            image_path: Path to image
+            image: Path to image, encoded image bytes, or BGR ndarray frame
+            long_edge: Maximum output size of the longer side in pixels
+            quality: JPEG quality
             
         Returns:
-            Base64 encoded optimized image
+            Optimized JPEG bytes
         """
-        img = Image.open(image_path)
+        if isinstance(image, bytes):
+            key = (hash(image), long_edge, quality)
+            stamp = len(image)
+        elif isinstance(image, str):
+            st = os.stat(image)
+            key = (image, long_edge, quality)
+            stamp = (st.st_mtime_ns, st.st_size)
+        else:
+            image = np.ascontiguousarray(image)
+            key = (_screen_hasher(image).digest(), long_edge, quality)
+            stamp = image.shape
         
-        # Convert to RGB
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        with self._img_lock:
+            cached = self._img_cache.get(key)
+            if cached and cached[0] == stamp:
+                self._img_cache.move_to_end(key)
+                return cached[1]
         
-        # Resize if large (max 1080px width)
-        if img.width > 1080:
-            ratio = 1080 / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((1080, new_height), Image.Resampling.LANCZOS)
+        # Decode to BGR, resize (long_edge) + JPEG
+        if cv2 is not None:
+            jpeg_bytes = self._encode_cv(self._load_bgr(image), long_edge, quality)
+        else:
+            if isinstance(image, bytes):
+                img = Image.open(io.BytesIO(image))
+            elif isinstance(image, str):
+                img = Image.open(image)
+            else:
+                img = Image.fromarray(image[:, :, ::-1])
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            jpeg_bytes = self._encode_pil(img, long_edge, quality)
+        
+        # Cache (bounded LRU)
+        with self._img_lock:
+            self._img_cache[key] = (stamp, jpeg_bytes)
+            self._img_cache.move_to_end(key)
+            while len(self._img_cache) > self._img_cache_size:
+                self._img_cache.popitem(last=False)
+        
+        return jpeg_bytes
+    
+    def _to_base64(self, image_bytes: bytes) -> str:
+        """Base64-encode JPEG bytes for the JSON upload fallback."""
+        return base64.b64encode(image_bytes).decode('utf-8')
+    
+    def _encode_pil(self, img: Image.Image, long_edge: int, quality: int) -> bytes:
+        """Resize and JPEG-encode with PIL (Numba resize when available)."""
+        if _numba_downscale is not None and max(img.size) > long_edge:
+            img = Image.fromarray(_numba_downscale(img, long_edge))
+        else:
+            # In-place, aspect-preserving; no-op when already small enough
+            img.thumbnail((long_edge, long_edge), Image.Resampling.BILINEAR)
         
-        # Save as JPEG
         buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=85)
-        buffer.seek(0)
+        img.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+    
+    def _load_bgr(self, image: ScreenImage) -> "np.ndarray":
+        """Decode a screenshot to a 3-channel BGR frame with OpenCV (no PIL)."""
+        if isinstance(image, bytes):
+            frame = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        elif isinstance(image, str):
+            frame = cv2.imread(image, cv2.IMREAD_COLOR)
+        else:
+            return image if image.ndim == 3 and image.shape[2] == 3 else cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        
+        if frame is None:
+            raise ValueError("Could not decode screenshot")
+        return frame
+    
+    def _encode_cv(self, frame: "np.ndarray", long_edge: int, quality: int) -> bytes:
+        """
+        Resize and JPEG-encode a BGR frame.
+        
+        INTER_AREA resize runs in OpenCV's SIMD kernels; encoding uses
+        libjpeg-turbo when available, otherwise cv2.imencode.
+        """
+        height, width = frame.shape[:2]
+        scale = long_edge / max(height, width)
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        
+        if self._tj is not None:
+            return self._tj.encode(frame, quality=quality, pixel_format=TJPF_BGR)
         
-        # Encode to base64
-        encoded = base64.b64encode(buffer.read()).decode('utf-8')
-        return encoded
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buffer.tobytes()
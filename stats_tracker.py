@@ -8,31 +8,53 @@ Tracks all automation statistics:
 - Performance metrics
 """
 
-from typing import Dict
+from array import array
+from collections import deque
+from enum import IntEnum
+from typing import Dict, Union
+import logging
 import time
 
+from logger import get_logger
+
+log = get_logger("stats")
+# The summary is explicit output: shown whatever ANDROMATOR_LOG_LEVEL says
+log.setLevel(logging.INFO)
+
+# Counter slots in StatsTracker._c
+(IDX_QUERY, IDX_POINT, IDX_REASONING, IDX_CACHE_HIT,
+ IDX_ACTIONS, IDX_SUCCESS, IDX_FAIL, IDX_NAV,
+ IDX_MD_DET, IDX_UI_DET, IDX_IDLE_WAITS, IDX_IDLE_WAIT_MS,
+ IDX_UPLOADS, IDX_UPLOAD_BYTES) = range(14)
+NUM_COUNTERS = 14
+
+# Recent upload sizes kept for the median
+UPLOAD_SAMPLES = 256
+
+
+class DetectionSource(IntEnum):
+    """Where an element was found (value is its counter slot)."""
+    MOONDREAM = IDX_MD_DET
+    UIAUTOMATOR = IDX_UI_DET
+
+
+# Legacy string sources, accepted by record_detection() for one release
+_STR_TO_IDX = {"moondream": IDX_MD_DET, "uiautomator": IDX_UI_DET}.get
+
 
 class StatsTracker:
     """Clean, centralized statistics management."""
     
+    __slots__ = ('_c', 'upload_bytes', 'start_time', 'end_time')
+    
     def __init__(self):
         """Initialize statistics trackers."""
-        # API call tracking
-        self.moondream_query_calls = 0
-        self.moondream_point_calls = 0
-        self.moondream_reasoning_calls = 0
+        # All counters (API calls, actions, navigation, detections) in one
+        # contiguous buffer, indexed by the IDX_* constants
+        self._c = array('Q', bytes(8 * NUM_COUNTERS))
         
-        # Action tracking
-        self.actions_performed = 0
-        self.successful_actions = 0
-        self.failed_actions = 0
-        
-        # Navigation tracking
-        self.auto_navigations = 0
-        
-        # Element detection tracking
-        self.moondream_detections = 0
-        self.uiautomator_detections = 0
+        # Upload tracking (recent request body sizes, bytes)
+        self.upload_bytes = deque(maxlen=UPLOAD_SAMPLES)
         
         # Timing
         self.start_time = None
@@ -42,23 +64,50 @@ class StatsTracker:
     
     def start_test(self):
         """Mark test start time."""
-        self.start_time = time.time()
+        self.start_time = time.monotonic()
     
     def end_test(self):
         """Mark test end time."""
-        self.end_time = time.time()
+        self.end_time = time.monotonic()
     
     def record_query_call(self):
         """Record Moondream /v1/query call."""
-        self.moondream_query_calls += 1
+        self._c[IDX_QUERY] += 1
     
     def record_point_call(self):
         """Record Moondream /v1/point call."""
-        self.moondream_point_calls += 1
+        self._c[IDX_POINT] += 1
     
     def record_reasoning_call(self):
         """Record Moondream reasoning/navigation call."""
-        self.moondream_reasoning_calls += 1
+        self._c[IDX_REASONING] += 1
+    
+    def record_cache_hit(self):
+        """Record a Moondream answer served from cache (no API call)."""
+        self._c[IDX_CACHE_HIT] += 1
+    
+    def record_upload(self, num_bytes: int):
+        """
+        Record size of a Moondream request body.
+        
+        Args:
+            num_bytes: Bytes uploaded
+        """
+        c = self._c
+        c[IDX_UPLOADS] += 1
+        c[IDX_UPLOAD_BYTES] += num_bytes
+        self.upload_bytes.append(num_bytes)
+    
+    def record_idle_wait(self, seconds: float):
+        """
+        Record time spent waiting for the UI to go idle.
+        
+        Args:
+            seconds: Time actually waited
+        """
+        c = self._c
+        c[IDX_IDLE_WAITS] += 1
+        c[IDX_IDLE_WAIT_MS] += int(seconds * 1000)
     
     def record_action(self, success: bool):
         """
@@ -67,33 +116,84 @@ class StatsTracker:
         Args:
             success: Whether action succeeded
         """
-        self.actions_performed += 1
-        if success:
-            self.successful_actions += 1
-        else:
-            self.failed_actions += 1
+        c = self._c
+        c[IDX_ACTIONS] += 1
+        c[IDX_SUCCESS if success else IDX_FAIL] += 1
     
     def record_navigation(self):
         """Record auto-navigation attempt."""
-        self.auto_navigations += 1
+        self._c[IDX_NAV] += 1
     
-    def record_detection(self, source: str):
+    def record_detection(self, source: Union[DetectionSource, str]):
         """
         Record element detection.
         
         Args:
-            source: "moondream" or "uiautomator"
+            source: DetectionSource (legacy "moondream"/"uiautomator" still accepted)
         """
-        if source == "moondream":
-            self.moondream_detections += 1
-        elif source == "uiautomator":
-            self.uiautomator_detections += 1
+        if isinstance(source, str):
+            source = _STR_TO_IDX(source)
+            if source is None:
+                return
+        self._c[source] += 1
+    
+    # ==================== Counters ====================
+    
+    @property
+    def moondream_query_calls(self) -> int:
+        """Moondream /v1/query calls."""
+        return self._c[IDX_QUERY]
+    
+    @property
+    def moondream_point_calls(self) -> int:
+        """Moondream /v1/point calls."""
+        return self._c[IDX_POINT]
+    
+    @property
+    def moondream_reasoning_calls(self) -> int:
+        """Moondream reasoning/navigation calls."""
+        return self._c[IDX_REASONING]
+    
+    @property
+    def cache_hits(self) -> int:
+        """Answers served from the result cache."""
+        return self._c[IDX_CACHE_HIT]
+    
+    @property
+    def actions_performed(self) -> int:
+        """Actions executed."""
+        return self._c[IDX_ACTIONS]
+    
+    @property
+    def successful_actions(self) -> int:
+        """Actions that succeeded."""
+        return self._c[IDX_SUCCESS]
+    
+    @property
+    def failed_actions(self) -> int:
+        """Actions that failed."""
+        return self._c[IDX_FAIL]
+    
+    @property
+    def auto_navigations(self) -> int:
+        """Auto-navigation attempts."""
+        return self._c[IDX_NAV]
+    
+    @property
+    def moondream_detections(self) -> int:
+        """Elements found by Moondream."""
+        return self._c[IDX_MD_DET]
+    
+    @property
+    def uiautomator_detections(self) -> int:
+        """Elements found by UIAutomator2."""
+        return self._c[IDX_UI_DET]
     
     # ==================== Summary Methods ====================
     
     def get_duration(self) -> float:
         """Get test duration in seconds."""
-        if self.start_time and self.end_time:
+        if self.start_time is not None and self.end_time is not None:
             return self.end_time - self.start_time
         return 0.0
     
@@ -111,6 +211,12 @@ class StatsTracker:
         """Get total element detections."""
         return self.moondream_detections + self.uiautomator_detections
     
+    def get_upload_p50(self) -> int:
+        """Get median size of the last UPLOAD_SAMPLES Moondream uploads in bytes."""
+        if not self.upload_bytes:
+            return 0
+        return sorted(self.upload_bytes)[len(self.upload_bytes) // 2]
+    
     def get_summary(self) -> Dict:
         """
         Get complete statistics summary.
@@ -125,56 +231,96 @@ class StatsTracker:
                 "total": self.actions_performed,
                 "successful": self.successful_actions,
                 "failed": self.failed_actions,
-                "success_rate": round(self.get_success_rate(), 2)
+                "success_rate": self.get_success_rate()
             },
             "api_calls": {
                 "moondream_query": self.moondream_query_calls,
                 "moondream_point": self.moondream_point_calls,
                 "moondream_reasoning": self.moondream_reasoning_calls,
-                "total": self.get_total_api_calls()
+                "total": self.get_total_api_calls(),
+                "cache_hits": self.cache_hits
             },
             "detection": {
                 "moondream": self.moondream_detections,
                 "uiautomator": self.uiautomator_detections,
                 "total": total_detections,
-                "moondream_percentage": round((self.moondream_detections / total_detections * 100), 1) if total_detections > 0 else 0
+                "moondream_percentage": self.moondream_detections / total_detections * 100 if total_detections > 0 else 0.0
             },
             "navigation": {
                 "auto_navigations": self.auto_navigations
             },
+            "uploads": {
+                "count": self._c[IDX_UPLOADS],
+                "p50_bytes": self.get_upload_p50(),
+                "total_bytes": self._c[IDX_UPLOAD_BYTES]
+            },
             "timing": {
-                "duration_seconds": round(self.get_duration(), 2)
+                "duration_seconds": self.get_duration(),
+                "idle_waits": self._c[IDX_IDLE_WAITS],
+                "idle_wait_seconds": self._c[IDX_IDLE_WAIT_MS] / 1000
             }
         }
     
-    def print_summary(self, app_name: str = "Test"):
+    def format_summary(self, app_name: str = "Test") -> str:
         """
-        Print formatted statistics summary.
+        Format the statistics summary as one printable block.
         
         Args:
             app_name: Name of the app being tested
+            
+        Returns:
+            Multi-line summary text
         """
-        print(f"\n{'='*80}")
-        print(f"🏁 Test Complete: {app_name}")
-        print(f"✅ Successful: {self.successful_actions}/{self.actions_performed} ({self.get_success_rate():.1f}%)")
-        print(f"❌ Failed: {self.failed_actions}")
+        c = self._c
+        total = c[IDX_ACTIONS]
+        md_det = c[IDX_MD_DET]
+        ui_det = c[IDX_UI_DET]
+        reasoning = c[IDX_REASONING]
+        navigations = c[IDX_NAV]
+        duration = self.get_duration()
+        rule = '=' * 80
         
-        total_detections = self.get_total_detections()
+        lines = [
+            f"\n{rule}",
+            f"🏁 Test Complete: {app_name}",
+            f"✅ Successful: {c[IDX_SUCCESS]}/{total} ({self.get_success_rate():.1f}%)",
+            f"❌ Failed: {c[IDX_FAIL]}"
+        ]
+        
+        total_detections = md_det + ui_det
         if total_detections > 0:
-            print(f"\n📊 Element Detection:")
-            print(f"   🔮 Moondream: {self.moondream_detections}/{total_detections} ({self.moondream_detections/total_detections*100:.1f}%)")
-            print(f"   🤖 UIAutomator2: {self.uiautomator_detections}/{total_detections} ({self.uiautomator_detections/total_detections*100:.1f}%)")
+            lines += [
+                "\n📊 Element Detection:",
+                f"   🔮 Moondream: {md_det}/{total_detections} ({md_det/total_detections*100:.1f}%)",
+                f"   🤖 UIAutomator2: {ui_det}/{total_detections} ({ui_det/total_detections*100:.1f}%)"
+            ]
         
-        if self.moondream_reasoning_calls > 0 or self.auto_navigations > 0:
-            print(f"\n🧠 Intelligence:")
-            print(f"   💭 Reasoning Calls: {self.moondream_reasoning_calls}")
-            print(f"   🔄 Auto-Navigations: {self.auto_navigations}")
-            print(f"   📡 Total API Calls: {self.get_total_api_calls()}")
+        if reasoning > 0 or navigations > 0:
+            lines += [
+                "\n🧠 Intelligence:",
+                f"   💭 Reasoning Calls: {reasoning}",
+                f"   🔄 Auto-Navigations: {navigations}",
+                f"   📡 Total API Calls: {c[IDX_QUERY] + c[IDX_POINT]}",
+                f"   ♻️  Cache Hits: {c[IDX_CACHE_HIT]}"
+            ]
         
-        if self.get_duration() > 0:
-            print(f"\n⏱️  Duration: {self.get_duration():.1f}s")
+        if duration > 0:
+            lines.append(f"\n⏱️  Duration: {duration:.1f}s")
         
-        print(f"{'='*80}\n")
+        lines.append(f"{rule}\n")
+        return "\n".join(lines)
+    
+    def print_summary(self, app_name: str = "Test"):
+        """
+        Print formatted statistics summary as a single log record.
+        
+        Goes through the queued logger, so it lands after every line
+        logged before it.
+        
+        Args:
+            app_name: Name of the app being tested
+        """
+        log.info(self.format_summary(app_name))
     
     def reset(self):
         """Reset all statistics."""
@@ -12,12 +12,27 @@ Architecture:
 - Clean separation of concerns
 """
 
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+import asyncio
+import os
+import re
 import time
 
-from device_controller import DeviceController
+from device_controller import DeviceController, image_extension
 from screen_parser import ScreenParser
 from stats_tracker import StatsTracker
+from logger import get_logger
+
+log = get_logger("agent")
+
+
+class ParsedStep(NamedTuple):
+    """A test step, classified once before the run."""
+    raw: str
+    action: Optional[Dict]  # Batchable device action (scroll/key), else None
+    needs_screen: bool  # Needs a capture to locate its target
+    needs_coords: bool  # Fails without a located target (typing doesn't)
 
 
 class VisionAgent:
@@ -31,26 +46,49 @@ class VisionAgent:
     4. ACTION: UIAutomator2 performs actions
     """
     
-    def __init__(self, moondream_api_key: str, intelligent_mode: bool = True):
+    # Steps the device performs without looking at the screen
+    _NONVISUAL_RE = re.compile(r'\b(?:scroll|swipe|back|home|wait)\b', re.IGNORECASE)
+    # Typing can go to the focused field when no target is found
+    _TYPE_RE = re.compile(r'\btype\b', re.IGNORECASE)
+    
+    def __init__(self, moondream_api_key: str, intelligent_mode: bool = True,
+                 speculative_reasoning: bool = False):
         """
         Initialize agent with clean composition.
         
         Args:
             moondream_api_key: Moondream API key
             intelligent_mode: Enable auto-navigation and reasoning
+            speculative_reasoning: In intelligent mode, ask for navigation
+                advice alongside every locate (saves a round-trip on misses,
+                costs a reasoning call on hits)
         """
         self.intelligent_mode = intelligent_mode
-        self.screenshot_path = "current_screen.png"
+        self.speculative_reasoning = speculative_reasoning
+        self.screenshot_path = "current_screen.jpg"
+        self._screen: Optional[bytes] = None  # Latest in-memory capture
+        self._last_capture_ts = 0.0  # monotonic time of _screen
+        self._capture_epoch = -1  # device.action_count at capture
+        self._screen_staleness_s = 0.8  # reuse window (UI settle interval)
         
         # Initialize components (composition, not inheritance!)
-        print(f"\n🚀 Initializing Manava for Mobile...")
-        print(f"🧠 Intelligent mode: {'ENABLED' if intelligent_mode else 'DISABLED'}\n")
+        log.info("\n🚀 Initializing Manava for Mobile...")
+        log.info("🧠 Intelligent mode: %s\n", "ENABLED" if intelligent_mode else "DISABLED")
         
         self.device = DeviceController()
         self.stats = StatsTracker()
-        self.vision = ScreenParser(moondream_api_key, self.stats)
+        self.vision = ScreenParser(
+            moondream_api_key, self.stats,
+            epoch=lambda: self.device.action_count
+        )
+        
+        # Single worker keeps device captures/actions strictly ordered
+        self._device_executor = ThreadPoolExecutor(max_workers=1)
         
-        print(f"✅ All systems ready!\n")
+        # Speculative navigation-advice queries run here
+        self._reasoning_executor = ThreadPoolExecutor(max_workers=1)
+        
+        log.info("✅ All systems ready!\n")
     
     # ==================== Core Workflow ====================
     
@@ -58,6 +96,29 @@ class VisionAgent:
         """
         Execute test case from JSON.
         
+        Synchronous wrapper around run_test_case_async() for callers
+        outside an event loop.
+        
+        Args:
+            test_json: {
+                "app_name": str,
+                "steps": [str]  # Natural language steps
+            }
+            
+        Returns:
+            See run_test_case_async()
+        """
+        return asyncio.run(self.run_test_case_async(test_json))
+    
+    async def run_test_case_async(self, test_json: Dict) -> Dict:
+        """
+        Execute test case from JSON on the event loop.
+        
+        Device I/O runs on a single-worker executor, so captures and
+        actions stay strictly ordered; Moondream calls run off the event
+        loop. After each step the UI gets an idle wait; steps that need
+        no screen (scroll, back, wait) skip the capture.
+        
         Args:
             test_json: {
                 "app_name": str,
@@ -76,32 +137,61 @@ class VisionAgent:
         app_name = test_json.get("app_name", "Test")
         steps = test_json.get("steps", [])
         
-        print(f"\n{'='*80}")
-        print(f"🎬 Starting Test: {app_name}")
-        print(f"📝 Total Steps: {len(steps)}")
-        print(f"{'='*80}\n")
+        log.info("\n%s", "=" * 80)
+        log.info("🎬 Starting Test: %s", app_name)
+        log.info("📝 Total Steps: %s", len(steps))
+        log.info("%s\n", "=" * 80)
         
         self.stats.start_test()
+        plan = self._compile_plan(steps)
         completed_steps = 0
         failed_step = None
         
         try:
-            for idx, step in enumerate(steps, 1):
-                print(f"\n--- Step {idx}/{len(steps)}: {step} ---")
+            idx = 0
+            while idx < len(plan):
+                # Runs of screen-independent steps (scroll/back/home) go to
+                # the device as a single adb shell call
+                batch = self._collect_batch(plan, idx)
                 
-                # Execute step
-                success = self._execute_step(step)
+                if len(batch) > 1:
+                    count = len(batch)
+                    log.info("\n--- Steps %s-%s/%s: batched ---", idx + 1, idx + count, len(steps))
+                    for step in steps[idx:idx + count]:
+                        log.info("   • %s", step)
+                    
+                    done = await self._device_call(self.device.batch_actions, batch)
+                    for _ in range(done):
+                        self.stats.record_action(True)
+                    
+                    success = done == count
+                    if not success:
+                        # Steps before the failing command did run
+                        self.stats.record_action(False)
+                        completed_steps += done
+                        idx += done
+                else:
+                    count = 1
+                    log.info("\n--- Step %s/%s: %s ---", idx + 1, len(steps), steps[idx])
+                    
+                    # Execute step
+                    success = await self._execute_step(plan[idx])
                 
                 if success:
-                    completed_steps += 1
-                    print(f"✅ Step {idx} completed")
+                    completed_steps += count
+                    log.info("✅ Step %s completed", idx + count)
                 else:
-                    failed_step = step
-                    print(f"❌ Step {idx} failed")
+                    failed_step = steps[idx]
+                    log.error("❌ Step %s failed", idx + 1)
                     break
                 
-                # Brief pause between steps
-                time.sleep(0.5)
+                idx += count
+                
+                # Wait for the UI to go idle (<= 500ms) before the next step.
+                # The next capture is not prefetched: it must show the result
+                # of this step's action, so it can't start any earlier
+                if idx < len(steps):
+                    await self._device_call(self._wait_idle, 500)
         
         finally:
             self.stats.end_test()
@@ -120,7 +210,7 @@ class VisionAgent:
             "statistics": self.stats.get_summary()
         }
     
-    def _execute_step(self, step: str) -> bool:
+    async def _execute_step(self, step: ParsedStep) -> bool:
         """
         Execute a single step.
         
@@ -131,35 +221,33 @@ class VisionAgent:
         4. Record result
         
         Args:
-            step: Natural language step
+            step: Step from _compile_plan()
             
         Returns:
             Success status
         """
         try:
-            # 1. Capture screen
-            print("📸 Capturing screen...")
-            if not self.device.capture_screen(self.screenshot_path):
-                print("❌ Failed to capture screen")
-                return False
-            
-            # 2. Locate element
             coords = None
             
-            # Check if this is a non-visual action (scroll, back, wait)
-            step_lower = step.lower()
-            if any(cmd in step_lower for cmd in ["scroll", "swipe", "back", "home", "wait"]):
-                # Direct action, no location needed
-                pass
-            else:
-                # Need to locate element
+            # Non-visual actions (scroll, back, wait) need no screen or location
+            if step.needs_screen:
+                # 1. Capture screen
+                log.debug("📸 Capturing screen...")
+                screen = await self._device_call(self.device.capture_screen_bytes)
+                
+                if screen is None:
+                    log.error("❌ Failed to capture screen")
+                    return False
+                self._set_screen(screen)
+                
+                # 2. Locate element
                 if self.intelligent_mode:
-                    coords = self._intelligent_locate(step)
+                    coords = await asyncio.to_thread(self._intelligent_locate, step.raw)
                 else:
-                    coords = self._basic_locate(step)
+                    coords = await self._basic_locate(step.raw)
                 
-                if coords is None and "type" not in step_lower:
-                    print(f"❌ Could not locate element for: {step}")
+                if coords is None and step.needs_coords:
+                    log.error("❌ Could not locate element for: %s", step.raw)
                     self.stats.record_action(False)
                     return False
             
@@ -168,7 +256,7 @@ class VisionAgent:
             if coords:
                 pixel_coords = self.device.convert_normalized_to_pixels(coords['x'], coords['y'])
             
-            success = self.device.perform_action(step, pixel_coords)
+            success = await self._device_call(self.device.perform_action, step.raw, pixel_coords)
             
             # 4. Record result
             self.stats.record_action(success)
@@ -176,13 +264,54 @@ class VisionAgent:
             return success
             
         except Exception as e:
-            print(f"❌ Step execution error: {e}")
+            log.error("❌ Step execution error: %s", e)
             self.stats.record_action(False)
             return False
     
+    def _compile_plan(self, steps: List[str]) -> List[ParsedStep]:
+        """Classify every step once, up front, so the run loop never re-parses."""
+        plan = []
+        for step in steps:
+            needs_screen = self._needs_screen(step)
+            plan.append(ParsedStep(
+                raw=step,
+                action=self.device.step_to_action(step),
+                needs_screen=needs_screen,
+                needs_coords=needs_screen and self._TYPE_RE.search(step) is None
+            ))
+        return plan
+    
+    def _collect_batch(self, plan: List[ParsedStep], start: int) -> List[Dict]:
+        """Batchable device actions for the run of steps starting at start."""
+        batch = []
+        for step in plan[start:]:
+            if step.action is None:
+                break
+            batch.append(step.action)
+        return batch
+    
+    def _needs_screen(self, step: str) -> bool:
+        """Whether a step needs a screenshot to locate its target."""
+        return self._NONVISUAL_RE.search(step) is None
+    
+    def _device_call(self, fn, *args) -> asyncio.Future:
+        """Run a blocking device operation on the ordered device executor."""
+        return asyncio.get_running_loop().run_in_executor(self._device_executor, fn, *args)
+    
+    def _device_sync(self, fn, *args):
+        """Blocking variant of _device_call() for code outside the event loop."""
+        return self._device_executor.submit(fn, *args).result()
+    
+    def _wait_idle(self, max_ms: int) -> bool:
+        """Wait (at most max_ms) for the UI to go idle and record the time spent."""
+        start = time.monotonic()
+        idle = self.device.wait_for_idle(max_ms=max_ms)
+        self.stats.record_idle_wait(time.monotonic() - start)
+        return idle
+    
     # ==================== Element Location Strategies ====================
     
-    def _basic_locate(self, step: str) -> Optional[Dict]:
+    async def _basic_locate(self, step: str) -> Optional[Dict]:
         """
         Basic location: Direct Moondream lookup.
         
@@ -192,17 +321,17 @@ class VisionAgent:
         Returns:
             {'x': float, 'y': float} or None
         """
-        print("🔍 Locating element...")
-        return self.vision.locate(self.screenshot_path, step)
+        log.debug("🔍 Locating element...")
+        return await self.vision.locate_async(self._screen, step)
     
     def _intelligent_locate(self, step: str, max_retries: int = 3) -> Optional[Dict]:
         """
         Intelligent location with auto-navigation.
         
         Flow:
-        1. Check if element visible
-        2. If not visible → Ask Moondream for navigation
-        3. Execute navigation action
+        1. Try to locate element
+        2. If not found → Ask Moondream if it's visible and how to navigate
+        3. Execute navigation action (skipped if visible)
         4. Retry location
         5. Repeat up to max_retries
         
@@ -213,44 +342,102 @@ class VisionAgent:
         Returns:
             {'x': float, 'y': float} or None
         """
-        print("🔍 Intelligent locate (with auto-navigation)...")
+        log.debug("🔍 Intelligent locate (with auto-navigation)...")
         
         for attempt in range(max_retries):
+            last_attempt = attempt == max_retries - 1
+            
+            # Speculatively ask for navigation advice on the same screen
+            advice = None
+            if self.speculative_reasoning and not last_attempt:
+                advice = self._reasoning_executor.submit(
+                    self.vision.visibility_and_suggestion, self._screen, step
+                )
+            
             # Try to locate
-            coords = self.vision.locate(self.screenshot_path, step)
+            coords = self.vision.locate(self._screen, step)
             
             if coords:
+                if advice is not None:
+                    advice.cancel()
                 return coords
             
             # If not found and not last attempt
-            if attempt < max_retries - 1:
-                print(f"🤔 Element not found (attempt {attempt + 1}/{max_retries})")
-                print("🧠 Asking Moondream for navigation advice...")
+            if not last_attempt:
+                log.info("🤔 Element not found (attempt %s/%s)", attempt + 1, max_retries)
+                log.info("🧠 Asking Moondream for navigation advice...")
                 
-                # Get navigation suggestion
-                action = self.vision.get_navigation_suggestion(self.screenshot_path, step)
+                # Visibility + navigation suggestion in one query
+                if advice is not None:
+                    visible, action = advice.result()
+                else:
+                    visible, action = self.vision.visibility_and_suggestion(self._screen, step)
                 
-                if action and "not possible" not in action:
-                    print(f"💡 Moondream suggests: {action}")
+                if visible:
+                    log.info("👀 Moondream sees the element, retrying locate")
+                elif action and "not possible" not in action:
+                    log.info("💡 Moondream suggests: %s", action)
                     self.stats.record_navigation()
                     
                     # Execute navigation
-                    if self.device.perform_action(action):
-                        print("✅ Navigation executed")
-                        time.sleep(1)  # Wait for UI to settle
+                    if self._device_sync(self.device.perform_action, action):
+                        log.info("✅ Navigation executed")
+                        self._device_sync(self._wait_idle, 1500)
                         
                         # Recapture screen
-                        self.device.capture_screen(self.screenshot_path)
+                        self._capture_screen()
                     else:
-                        print("❌ Navigation failed")
+                        log.warning("❌ Navigation failed")
                 else:
-                    print("❌ Moondream says navigation not possible")
+                    log.warning("❌ Moondream says navigation not possible")
                     break
         
         return None
     
     # ==================== Helper Methods ====================
     
+    def shutdown(self):
+        """
+        Release HTTP connections and worker threads.
+        
+        Call once the agent is no longer needed (e.g. server shutdown);
+        run_test_case() reuses the pooled connections across tests.
+        """
+        self.vision.close()
+        self.device.close()
+        self._device_executor.shutdown(wait=False)
+        self._reasoning_executor.shutdown(wait=False)
+        log.info("👋 Agent shut down")
+    
+    def _capture_screen(self) -> bool:
+        """
+        Capture the screen into memory for the next Moondream call.
+        
+        Returns:
+            Success status
+        """
+        screen = self._device_sync(self.device.capture_screen_bytes)
+        if screen is None:
+            return False
+        self._set_screen(screen)
+        return True
+    
+    def _set_screen(self, screen: bytes):
+        """Store a new capture and stamp it for freshness checks."""
+        self._screen = screen
+        self._last_capture_ts = time.monotonic()
+        self._capture_epoch = self.device.action_count
+    
+    def _screen_is_fresh(self) -> bool:
+        """Whether _screen is recent and no device action has run since."""
+        return (self._screen is not None
+                and self._capture_epoch == self.device.action_count
+                and time.monotonic() - self._last_capture_ts <= self._screen_staleness_s)
+    
+    def _ensure_screen(self) -> bool:
+        """Reuse a fresh capture, otherwise capture the screen."""
+        return self._screen_is_fresh() or self._capture_screen()
+    
     def get_statistics(self) -> Dict:
         """Get current statistics."""
         return self.stats.get_summary()
@@ -259,10 +446,20 @@ class VisionAgent:
         """
         Get current screenshot path.
         
+        A fresh in-memory capture is written out as-is instead of
+        taking a new screenshot; the file extension follows its format
+        (JPEG from uiautomator2, PNG from the screencap fallback).
+        
         Returns:
             Path to latest screenshot
         """
-        self.device.capture_screen(self.screenshot_path)
+        if self._screen_is_fresh():
+            path = os.path.splitext(self.screenshot_path)[0] + image_extension(self._screen)
+            with open(path, 'wb') as f:
+                f.write(self._screen)
+            return path
+        
+        self._device_sync(self.device.capture_screen, self.screenshot_path)
         return self.screenshot_path
     
     def query_screen(self, question: str) -> Optional[str]:
@@ -275,8 +472,55 @@ class VisionAgent:
         Returns:
             Answer string
         """
-        self.device.capture_screen(self.screenshot_path)
-        return self.vision.query(self.screenshot_path, question)
+        if not self._ensure_screen():
+            return None
+        return self.vision.query(self._screen, question)
+    
+    async def query_screen_async(self, question: str) -> Optional[str]:
+        """
+        Async version of query_screen().
+        
+        Args:
+            question: Question to ask
+            
+        Returns:
+            Answer string
+        """
+        if not self._screen_is_fresh():
+            screen = await self._device_call(self.device.capture_screen_bytes)
+            if screen is None:
+                return None
+            self._set_screen(screen)
+        return await self.vision.query_async(self._screen, question)
+    
+    def parse_screen_for_llm(self) -> Dict:
+        """
+        Parse current screen into structured JSON for LLM consumption.
+        
+        Returns:
+            {"success": True, "app_context", "interactive_elements",
+             "visible_content", "metadata"} or {"success": False, "error": str}
+        """
+        if not self._ensure_screen():
+            return {"success": False, "error": "Failed to capture screen"}
+        
+        parsed = self.vision.parse_screen(self._screen)
+        if parsed is None:
+            return {"success": False, "error": "Moondream returned no structured description"}
+        
+        return {
+            "success": True,
+            "app_context": parsed.get("app_context", {}),
+            "interactive_elements": parsed.get("interactive_elements", []),
+            "visible_content": parsed.get("visible_content", []),
+            "metadata": {
+                "screen_size": {
+                    "width": self.device.screen_width,
+                    "height": self.device.screen_height
+                },
+                "source": "moondream"
+            }
+        }
     
     def validate_screen(self, expectation: str) -> bool:
         """
@@ -288,8 +532,9 @@ class VisionAgent:
         Returns:
             True if validation passed
         """
-        self.device.capture_screen(self.screenshot_path)
-        return self.vision.validate_action(self.screenshot_path, expectation)
+        if not self._ensure_screen():
+            return False
+        return self.vision.validate_action(self._screen, expectation)
 
 
 # ==================== Quick Testing ====================